@@ -2,68 +2,47 @@ import asyncio
 import sys
 from pathlib import Path
 import re
-from urllib.parse import urlsplit, urlunsplit
 
-from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
+from aiohttp import ClientSession
+from selectolax.lexbor import LexborHTMLParser
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from data_processing.utils.http_utils import BROWSER_HEADERS, default_request_timeout
+from data_processing.utils.http_utils import (
+    build_paged_url,
+    fetch_bytes,
+    is_page_not_found,
+    parse_html,
+    parse_last_page,
+    with_session,
+)
 
-LBX_BASE = "https://letterboxd.com"
+# Review permalinks anywhere in the page (relative or absolute):
+#   /<reviewer>/film/<slug>/...
+# group(1) = reviewer, group(2) = film slug
+REVIEW_URL_RE_B = re.compile(rb"/([^/?#\"'\s<>]+)/film/([^/?#\"'\s<>]+)", re.IGNORECASE)
 
+_INT_RE = re.compile(r"(\d[\d,]*)")
+_OG_PROFILE_RE = re.compile(r"(.+?)’s profile")
 
-async def fetch(url: str, session: ClientSession) -> bytes | None:
-    try:
-        async with session.get(url, timeout=ClientTimeout(total=default_request_timeout)) as r:
-            return await r.read()
-    except Exception:
-        return None
-
-
-def _is_page_not_found(html: bytes) -> bool:
-    return b"Page not found" in html or b"page-not-found" in html
 
-
-def get_page_count_from_html(html: bytes) -> int:
-    """Find last pagination number (fallback to 1)."""
-    soup = BeautifulSoup(html, "lxml")
-
-    pages = []
-    for a in soup.select("div.paginate-pages a"):
-        t = (a.get_text() or "").strip()
-        if t.isdigit():
-            pages.append(int(t))
-    if pages:
-        return max(pages)
-
-    last = soup.select_one('link[rel="last"]')
-    if last and last.get("href"):
-        m = re.search(r"/page/(\d+)/", last["href"])
-        if m:
-            return int(m.group(1))
-
-    return 1
-
-
-def parse_display_name_from_profile(html: bytes) -> str | None:
+def parse_display_name_from_profile(html: bytes | LexborHTMLParser) -> str | None:
     """Extract display name from a profile page (robust fallbacks)."""
-    soup = BeautifulSoup(html, "lxml")
+    tree = parse_html(html)
 
     for sel in ("h1.person-display-name", "h1.profile-name", "h1"):
-        el = soup.select_one(sel)
+        el = tree.css_first(sel)
         if el:
-            txt = (el.get_text() or "").strip()
+            txt = el.text().strip()
             if txt and "Letterboxd" not in txt and "Your life in film" not in txt:
                 return txt
 
-    meta = soup.select_one("meta[property='og:title']")
-    if meta and meta.get("content"):
-        t = meta["content"].strip()
-        m = re.match(r"(.+?)’s profile", t)
+    meta = tree.css_first("meta[property='og:title']")
+    if meta and meta.attributes.get("content"):
+        t = meta.attributes["content"].strip()
+        m = _OG_PROFILE_RE.match(t)
         if m:
             return m.group(1).strip()
 
@@ -71,152 +50,106 @@ def parse_display_name_from_profile(html: bytes) -> str | None:
 
 
 def _extract_int_from_text(text: str) -> int | None:
-    m = re.search(r"(\d[\d,]*)", text)
+    m = _INT_RE.search(text)
     if not m:
         return None
     return int(m.group(1).replace(",", ""))
 
 
-def parse_reviews_written_from_profile(html: bytes, username: str) -> int | None:
+def parse_reviews_written_from_profile(html: bytes | LexborHTMLParser, username: str) -> int | None:
     """
     Extract the reviews count from the profile page by finding the
     '/<username>/reviews/' link and pulling a number from its text/children/attrs.
     """
-    soup = BeautifulSoup(html, "lxml")
+    tree = parse_html(html)
     target_href = f"/{username.lower()}/reviews/"
 
-    anchors = soup.select(f"a[href='{target_href}']")
+    anchors = tree.css(f"a[href='{target_href}']")
     if not anchors:
         anchors = [
-            a for a in soup.select("a[href]")
-            if (a.get("href") or "").lower().startswith(target_href)
+            a for a in tree.css("a[href]")
+            if (a.attributes.get("href") or "").lower().startswith(target_href)
         ]
 
     for a in anchors:
         # 1) Number in the anchor text
-        txt = " ".join(a.stripped_strings)
+        txt = a.text(separator=" ", strip=True)
         n = _extract_int_from_text(txt)
         if n is not None:
             return n
 
         # 2) Number in common child spans (stats often have a value span)
         for child_sel in ("span.value", "span.count", "span.stat-value", "strong"):
-            child = a.select_one(child_sel)
+            child = a.css_first(child_sel)
             if child:
-                n = _extract_int_from_text(child.get_text(" ", strip=True))
+                n = _extract_int_from_text(child.text(separator=" ", strip=True))
                 if n is not None:
                     return n
 
         # 3) data-* attributes
         for attr in ("data-count", "data-value", "data-stat"):
-            if a.has_attr(attr):
-                n = _extract_int_from_text(str(a.get(attr)))
+            if attr in a.attributes:
+                n = _extract_int_from_text(str(a.attributes.get(attr)))
                 if n is not None:
                     return n
 
     return None
 
 
-def _canonicalize_url(url: str) -> str:
-    """Remove query/fragment; keep scheme/netloc/path for stable dedupe."""
-    if not url:
-        return url
-    parts = urlsplit(url)
-    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
-
-
 def parse_review_items_count(html: bytes, username: str) -> int:
     """
     Count review entries on /<username>/reviews/ by extracting review permalinks:
       /<username>/film/<slug>/
       /<username>/film/<slug>/<id>/
     This avoids counting generic film links like /film/<slug>/ which caused your bug.
-    """
-    user = username.lower()
-    soup = BeautifulSoup(html, "lxml")
-
-    # Restrict to main content to avoid picking up unrelated links
-    main = (
-        soup.select_one("div.col-main") or
-        soup.select_one("main") or
-        soup.select_one("section.section") or
-        soup
-    )
-
-    # Match review permalinks for THIS user only
-    # group(1) = film slug
-    review_re = re.compile(
-        rf"(?:https?://(?:www\.)?letterboxd\.com)?/{re.escape(user)}/film/([^/?#\"']+)",
-        re.IGNORECASE,
-    )
-
-    # Raw scan can catch embedded paths that aren't direct anchors
-    raw_re = re.compile(
-        rf"(https?://(?:www\.)?letterboxd\.com)?(/" + re.escape(user) + r"/film/[^\"'\s?#]+)",
-        re.IGNORECASE,
-    )
-
-    review_keys: set[str] = set()
-
-    # 1) Anchor hrefs
-    for a in main.select("a[href]"):
-        href = a.get("href") or ""
-        if not href:
-            continue
 
-        # Build absolute URL to canonicalize
-        abs_url = href if href.startswith("http") else (LBX_BASE.rstrip("/") + href)
-        abs_url = _canonicalize_url(abs_url)
+    Scans the raw bytes directly: every anchor href is also present in the
+    raw HTML, so no tree is needed.
+    """
+    user = username.lower().encode()
+    review_keys: set[bytes] = set()
 
-        m = review_re.search(abs_url)
-        if not m:
+    for m in REVIEW_URL_RE_B.finditer(html):
+        if m.group(1).lower() != user:
             continue
-
-        film_slug = m.group(1).strip().lower()
         # Canonical key: one review per film per user
-        review_keys.add(f"/{user}/film/{film_slug}/")
-
-    # 2) Raw HTML scan fallback (covers odd markup)
-    html_text = html.decode("utf-8", errors="ignore")
-    for m in raw_re.finditer(html_text):
-        prefix = m.group(1) or LBX_BASE
-        path = m.group(2)
-        abs_url = _canonicalize_url(prefix.rstrip("/") + path)
-
-        m2 = review_re.search(abs_url)
-        if not m2:
-            continue
-
-        film_slug = m2.group(1).strip().lower()
-        review_keys.add(f"/{user}/film/{film_slug}/")
+        review_keys.add(m.group(2).lower())
 
     return len(review_keys)
 
 
-def build_paged_url(base: str, page: int) -> str:
-    return base if page <= 1 else f"{base}page/{page}/"
-
-
 async def get_reviews_written_count_from_reviews_pages(username: str, session: ClientSession) -> int:
     """
     Fallback: estimate count using /<username>/reviews/ pagination:
       total = (pages - 1) * per_page + last_page_count
+
+    Page 2 is requested alongside page 1; for two-page users it is the last
+    page, so the estimate costs a single round trip.
     """
     base = f"https://letterboxd.com/{username}/reviews/"
-    first_html = await fetch(base, session)
-    if not first_html or _is_page_not_found(first_html):
-        return 0
-
-    pages = get_page_count_from_html(first_html)
-    per_page = parse_review_items_count(first_html, username)
-    if per_page == 0:
-        return 0
-
-    if pages == 1:
-        return per_page
-
-    last_html = await fetch(build_paged_url(base, pages), session)
-    if not last_html or _is_page_not_found(last_html):
+    second_task = asyncio.create_task(fetch_bytes(build_paged_url(base, 2), session))
+    try:
+        first_html = await fetch_bytes(base, session)
+        if not first_html or is_page_not_found(first_html):
+            return 0
+
+        pages = parse_last_page(first_html)
+        per_page = parse_review_items_count(first_html, username)
+        if per_page == 0:
+            return 0
+
+        if pages == 1:
+            return per_page
+
+        if pages == 2:
+            last_html = await second_task
+        else:
+            second_task.cancel()
+            last_html = await fetch_bytes(build_paged_url(base, pages), session)
+    finally:
+        second_task.cancel()
+
+    if not last_html or is_page_not_found(last_html):
         return pages * per_page
 
     last_count = parse_review_items_count(last_html, username)
@@ -226,22 +159,26 @@ async def get_reviews_written_count_from_reviews_pages(username: str, session: C
     return (pages - 1) * per_page + last_count
 
 
-async def get_user_profile(username: str) -> tuple[str | None, int]:
-    """Returns (display_name, reviews_written_count)."""
+@with_session
+async def get_user_profile(username: str, session: ClientSession) -> tuple[str | None, int]:
+    """
+    Returns (display_name, reviews_written_count).
+    """
     profile_url = f"https://letterboxd.com/{username}/"
 
-    async with ClientSession(headers=BROWSER_HEADERS, connector=TCPConnector(limit=6)) as session:
-        profile_html = await fetch(profile_url, session)
-        if not profile_html or _is_page_not_found(profile_html):
-            return None, 0
+    profile_html = await fetch_bytes(profile_url, session)
+    if not profile_html or is_page_not_found(profile_html):
+        return None, 0
 
-        display_name = parse_display_name_from_profile(profile_html)
+    # One tree for both profile parsers
+    profile_tree = parse_html(profile_html)
+    display_name = parse_display_name_from_profile(profile_tree)
 
-        reviews_written = parse_reviews_written_from_profile(profile_html, username)
-        if reviews_written is None:
-            reviews_written = await get_reviews_written_count_from_reviews_pages(username, session)
+    reviews_written = parse_reviews_written_from_profile(profile_tree, username)
+    if reviews_written is None:
+        reviews_written = await get_reviews_written_count_from_reviews_pages(username, session)
 
-        return display_name, reviews_written
+    return display_name, reviews_written
 
 
 if __name__ == "__main__":
@@ -1,23 +1,49 @@
+import asyncio
 import re
 import logging
+import sys
+from pathlib import Path
+
+from aiohttp import ClientSession
+
 import get_user_ratings
 import get_user_watchlist
 
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from data_processing.utils.http_utils import FetchFailedError, with_session
+
 logger = logging.getLogger(__name__)
 USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{1,30}$")  # adjust if LB allows hyphens
 
 
-def get_user_film(username: str):
+@with_session
+async def get_user_film_async(username: str, session: ClientSession):
+    """
+    Ratings and watchlist scraped concurrently over one session.
+    """
     if not isinstance(username, str) or not USERNAME_RE.match(username):
         return [], "bad_username"
 
-    films, films_status = get_user_ratings.get_ratings_data(username)
-    watchlist, watch_status = get_user_watchlist.get_watchlist_data(username)
+    ratings, watchlist = await asyncio.gather(
+        get_user_ratings.get_user_ratings_enriched(username, session),
+        get_user_watchlist.get_user_watchlist(username, session),
+        return_exceptions=True,
+    )
+    if isinstance(ratings, BaseException):
+        raise ratings
+    films, films_status = ratings
 
     if films_status != "success":
         return [], films_status
-    if watch_status != "success":
-        return [], watch_status
+    if isinstance(watchlist, FetchFailedError):
+        return [], "fetch_failed"
+    if isinstance(watchlist, BaseException):
+        raise watchlist
+    if watchlist is None:
+        return [], "user_not_found"
 
     user_film = []
 
@@ -50,6 +76,10 @@ def get_user_film(username: str):
     return user_film, "success"
 
 
+def get_user_film(username: str):
+    return asyncio.run(get_user_film_async(username))
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     username = "Dcsoeirvy"
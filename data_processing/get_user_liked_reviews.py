@@ -3,70 +3,55 @@
 import asyncio
 import re
 import sys
+from functools import partial
+from html import unescape
 from pathlib import Path
 from typing import Counter
-from urllib.parse import urljoin, urlsplit, urlunsplit
 
-from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
+from aiohttp import ClientSession
+from selectolax.lexbor import LexborHTMLParser
 
 # Make project imports work whether executed from repo root or elsewhere
 PROJECT_ROOT = Path(__file__).resolve().parents[1]  # .../Letterboxd Taste Comparer
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from data_processing.utils.http_utils import BROWSER_HEADERS, default_request_timeout
+from data_processing.utils.http_utils import (
+    canonicalize_url,
+    crawl_pages,
+    fetch_bytes,
+    max_connections_per_host,
+    parse_html,
+    with_session,
+)
+from data_processing.utils.selectors import LBX_RESERVED_USER_PATHS
 
 LBX_BASE = "https://www.letterboxd.com"
 
 
-# -----------------------
-# Networking
-# -----------------------
-
-async def fetch_text(url: str, session: ClientSession, input_data=None):
-    if input_data is None:
-        input_data = {}
-    try:
-        async with session.get(url, timeout=ClientTimeout(total=default_request_timeout)) as response:
-            text = await response.text()
-            return text, {**input_data, "url": url, "status": response.status}
-    except Exception:
-        return None, {**input_data, "url": url, "status": None}
-
-
 # -----------------------
 # Parsing helpers
 # -----------------------
 
-# Review-ish URL patterns:
-#   /someuser/film/some-film/
-#   /someuser/film/some-film/1/
-#   https://www.letterboxd.com/someuser/film/some-film/12345/
-REVIEW_URL_RE = re.compile(
-    r"(?:https?://(?:www\.)?letterboxd\.com)?/([^/?#\"']+)/film/([^/?#\"']+)(?:/|$|\?)",
+# Raw byte scan for embedded URLs/paths (can include extra segments after slug)
+# group(1) = path starting at /<reviewer>/film/<slug>
+REVIEW_URL_RAW_RE_B = re.compile(
+    rb"(?:https?://(?:www\.)?letterboxd\.com)?(/[^/?#\"'\s<>]+/film/[^/?#\"'\s<>]+(?:/[^?#\"'\s<>]*)?)",
     re.IGNORECASE,
 )
 
-# Raw scan for embedded URLs/paths (can include extra segments after slug)
-REVIEW_URL_RAW_RE = re.compile(
-    r"(https?://(?:www\.)?letterboxd\.com)?(/[^\"'\s?#]+/film/[^\"'\s?#]+(?:/[^\"'\s?#]*)?)",
-    re.IGNORECASE,
-)
-
-_RESERVED_USER_PATHS = {
-    "film", "films", "review", "reviews", "likes", "activity", "journal",
-    "search", "lists", "members", "about", "contact", "settings", "sign-in",
-    "sign-up", "login", "logout"
-}
+# The likes feed's review list, and the first tag after it that isn't part of it
+_REVIEW_LIST_RE = re.compile(rb"<div\b[^>]*\bclass=\"(?:[^\"]*\s)?viewing-list[\s\"]")
+_REVIEW_LIST_END_RE = re.compile(rb"<(?:aside|footer)\b|<div\b[^>]*\bclass=\"(?:[^\"]*\s)?pagination[\s\"]")
 
+# Review page film title: <h1 ...><a href="/film/<slug>/">Title</a>
+_TITLE_RE = re.compile(rb"<h1[^>]*>\s*<a[^>]+href=\"/film/[^\"]+\"[^>]*>([^<]+)</a>", re.IGNORECASE)
 
-def _canonicalize_url(url: str) -> str:
-    """Remove query/fragment; keep scheme/netloc/path for stable dedupe."""
-    if not url:
-        return url
-    parts = urlsplit(url)
-    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+# First <span class="rating rated-NN"> on the page; group(1) = "rated-NN"
+# Exact class tokens, as span.rating[class*='rated-'] did: "rating-green" is not "rating"
+_RATING_CLASS_RE = re.compile(
+    rb"<span\b[^>]*\bclass=\"(?=(?:[^\"]*\s)?rating[\s\"])(?:[^\"]*\s)?(rated-\d{1,2})[\s\"]"
+)
 
 
 def _is_likes_url(url: str) -> bool:
@@ -76,86 +61,42 @@ def _is_likes_url(url: str) -> bool:
       /<reviewer>/film/<slug>/likes/     ("likes" page)
     We must drop the /likes/ URLs to avoid duplicates.
     """
-    try:
-        path = urlsplit(url).path.rstrip("/")
-        return path.endswith("/likes")
-    except Exception:
-        return False
+    return canonicalize_url(url or "").rstrip("/").endswith("/likes")
 
 
-def _extract_review_urls_from_likes_page(html: str) -> set[str]:
+def _extract_review_urls_from_likes_page(html: bytes, whole_page_fallback: bool = False) -> set[str]:
     """
     Extract review permalinks from the likes/reviews listing page.
 
-    Uses:
-      1) anchor href parsing
-      2) raw HTML regex scanning (catches URLs embedded outside anchors)
+    A single regex pass over the review list's raw bytes: anchors are a subset
+    of what the raw scan sees, so no tree is built here. With no review list,
+    the whole page is scanned only if whole_page_fallback is set; only do that
+    for a page known to exist, since past-the-end pages would yield links from
+    the page chrome.
 
     Filters OUT any ".../likes/" URLs to prevent doubled entries.
     """
-    urls = set()
-    soup = BeautifulSoup(html, "lxml")
-
-    # 1) anchors
-    for a in soup.select("a[href]"):
-        href = a.get("href") or ""
-        if not REVIEW_URL_RE.search(href):
-            continue
-
-        abs_url = href if href.startswith("http") else urljoin(LBX_BASE, href)
-        abs_url = _canonicalize_url(abs_url)
-
-        if _is_likes_url(abs_url):
-            continue
-
-        urls.add(abs_url)
+    start = _REVIEW_LIST_RE.search(html)
+    if start:
+        end = _REVIEW_LIST_END_RE.search(html, start.end())
+        scope = html[start.start():end.start() if end else len(html)]
+    elif whole_page_fallback:
+        scope = html
+    else:
+        return set()
 
-    # 2) raw HTML scan
-    for m in REVIEW_URL_RAW_RE.finditer(html):
-        prefix = m.group(1) or LBX_BASE
-        path = m.group(2)
-        abs_url = _canonicalize_url(prefix.rstrip("/") + path)
+    urls = set()
 
-        if not REVIEW_URL_RE.search(abs_url):
-            continue
-        if _is_likes_url(abs_url):
+    for m in REVIEW_URL_RAW_RE_B.finditer(scope):
+        path = m.group(1)
+        if path.rstrip(b"/").endswith(b"/likes"):
             continue
 
-        urls.add(abs_url)
+        urls.add(LBX_BASE + path.decode("utf-8", errors="ignore"))
 
     return urls
 
 
-def _find_next_page_url(html: str, current_url: str) -> str | None:
-    """
-    Find the next page in the likes feed, without relying on page counts.
-    Tries common patterns: rel=next, .next, .load-more, etc.
-    """
-    soup = BeautifulSoup(html, "lxml")
-
-    selectors = [
-        'a[rel="next"]',
-        "a.next",
-        "a.load-more",
-        "a.paginate-next",
-        "div.paginate-nextprev a[rel='next']",
-        "div.paginate-nextprev a.next",
-    ]
-
-    for sel in selectors:
-        a = soup.select_one(sel)
-        if a and a.get("href"):
-            return urljoin(current_url, a.get("href"))
-
-    # fallback: any link containing '/likes/reviews/page/'
-    for a in soup.select("a[href]"):
-        href = a.get("href") or ""
-        if "/likes/reviews/page/" in href:
-            return urljoin(current_url, href)
-
-    return None
-
-
 def _parse_rating_from_class(class_list) -> float:
     """
     Parse rating from classes like 'rated-45' => 4.5 stars (out of 5).
@@ -194,68 +135,89 @@ def _parse_rating_text(text: str) -> float:
 
 
 def _reviewer_from_review_url(url: str) -> str:
-    m = REVIEW_URL_RE.search(url or "")
-    if not m:
+    """
+    Review-ish URL shapes:
+      /someuser/film/some-film/
+      /someuser/film/some-film/1/
+      https://www.letterboxd.com/someuser/film/some-film/12345/
+    """
+    url = url or ""
+    if "//" in url:
+        url = url.partition("//")[2]
+    # ['<host or empty>', 'someuser', 'film', 'some-film/...']
+    parts = url.split("/", 3)
+    if len(parts) < 4 or parts[2] != "film":
         return "unknown"
-    reviewer = m.group(1)
-    if reviewer.lower() in _RESERVED_USER_PATHS:
+    reviewer = parts[1]
+    if not reviewer or reviewer.lower() in LBX_RESERVED_USER_PATHS:
         return "unknown"
     return reviewer
 
 
-def _parse_movie_title_from_review_page(soup: BeautifulSoup) -> str:
+def _parse_movie_title_from_review_page(tree: LexborHTMLParser) -> str:
     """
     Best-effort film title extraction from a review page.
     """
-    a = soup.select_one('h1 a[href^="/film/"]')
+    a = tree.css_first('h1 a[href^="/film/"]')
     if a:
-        t = a.get_text(" ", strip=True)
+        t = a.text(separator=" ", strip=True)
         if t:
             return t
 
-    a = soup.select_one('a[href^="/film/"][data-track-action], a[href^="/film/"].headline')
+    a = tree.css_first('a[href^="/film/"][data-track-action], a[href^="/film/"].headline')
     if a:
-        t = a.get_text(" ", strip=True)
+        t = a.text(separator=" ", strip=True)
         if t:
             return t
 
-    for a in soup.select('a[href^="/film/"]'):
-        t = a.get_text(" ", strip=True)
+    for a in tree.css('a[href^="/film/"]'):
+        t = a.text(separator=" ", strip=True)
         if t:
             return t
 
     return "Unknown"
 
 
-async def parse_review_detail(response):
+def parse_review_detail(response):
     """
-    Given the HTML for a single review permalink, return a dict:
+    Given (html_bytes, meta) for a single review permalink, return a dict:
       { reviewer, movie, rating_val, review_url }
+    meta["url"] is expected to be canonical already (see _extract_review_urls_from_likes_page).
     """
     if not response or not response[0]:
         return None
 
     html, meta = response
     url = (meta or {}).get("url", "")
-    url = _canonicalize_url(url)
 
     # Safety: ignore likes pages if they slip through
     if _is_likes_url(url):
         return None
 
-    soup = BeautifulSoup(html, "lxml")
-
     reviewer = _reviewer_from_review_url(url)
-    movie = _parse_movie_title_from_review_page(soup)
+
+    # Fast path: regexes over the raw bytes
+    movie = None
+    m = _TITLE_RE.search(html)
+    if m:
+        movie = unescape(m.group(1).decode("utf-8", errors="ignore")).strip() or None
 
     rating_val = -1
-    rating_el = soup.select_one("span.rating[class*='rated-']")
-    if rating_el:
-        rating_val = _parse_rating_from_class(rating_el.get("class", []))
-    if rating_val == -1:
-        rating_el = soup.select_one("span.rating")
-        if rating_el:
-            rating_val = _parse_rating_text(rating_el.get_text(" ", strip=True))
+    m = _RATING_CLASS_RE.search(html)
+    if m:
+        rating_val = _parse_rating_from_class([m.group(1).decode()])
+
+    # Build a tree only when the fast path missed something it could still find
+    needs_title = movie is None
+    needs_rating = rating_val == -1 and "★".encode() in html
+    if needs_title or needs_rating:
+        tree = parse_html(html)
+        if needs_title:
+            movie = _parse_movie_title_from_review_page(tree)
+        if needs_rating:
+            rating_el = tree.css_first("span.rating")
+            if rating_el:
+                rating_val = _parse_rating_text(rating_el.text(separator=" ", strip=True))
 
     return {
         "reviewer": reviewer,
@@ -269,66 +231,50 @@ async def parse_review_detail(response):
 # Scrapers
 # -----------------------
 
-async def get_all_likes_review_urls(username: str, session: ClientSession) -> list[str]:
+async def get_all_likes_review_urls(username: str, session: ClientSession) -> set[str]:
     """
-    Crawl /{username}/likes/reviews/ by following "next" links until none remain.
+    Crawl /{username}/likes/reviews/page/N/ in speculative batches until a page
+    is missing or adds no new review URLs.
     """
-    start_url = f"{LBX_BASE}/{username}/likes/reviews/"
-    current = start_url
-    seen_pages = set()
-    review_urls = set()
+    base = f"{LBX_BASE}/{username}/likes/reviews/"
+    return await crawl_pages(
+        base, session, _extract_review_urls_from_likes_page,
+        parse_first=partial(_extract_review_urls_from_likes_page, whole_page_fallback=True),
+    )
 
-    while current and current not in seen_pages:
-        seen_pages.add(current)
 
-        html, _meta = await fetch_text(current, session, {"username": username})
-        if not html:
-            break
-
-        review_urls |= _extract_review_urls_from_likes_page(html)
-
-        nxt = _find_next_page_url(html, current)
-        current = _canonicalize_url(nxt) if nxt else None
-
-    return sorted(review_urls)
-
-
-async def get_user_liked_reviews(username: str):
+@with_session
+async def get_user_liked_reviews(username: str, session: ClientSession):
     """
     Returns (liked_reviews, status) where liked_reviews is a list of dicts:
       { reviewer, movie, rating_val, review_url }
     """
-    connector = TCPConnector(limit=6, ttl_dns_cache=3600)
-    async with ClientSession(headers=BROWSER_HEADERS, connector=connector) as session:
-        review_urls = await get_all_likes_review_urls(username, session=session)
-        if not review_urls:
-            return [], "success"
+    review_urls = await get_all_likes_review_urls(username, session=session)
+    if not review_urls:
+        return [], "success"
 
-        sem = asyncio.Semaphore(6)
+    sem = asyncio.Semaphore(max_connections_per_host)
 
-        async def bounded_fetch(u: str):
-            async with sem:
-                return await fetch_text(u, session, {"url": u})
+    async def fetch_and_parse(u: str):
+        async with sem:
+            response = await fetch_bytes(u, session), {"url": u}
+        # Parse on a worker thread so the event loop keeps draining sockets
+        return await asyncio.to_thread(parse_review_detail, response)
 
-        review_pages = await asyncio.gather(*[bounded_fetch(u) for u in review_urls])
-        parsed = await asyncio.gather(*[parse_review_detail(r) for r in review_pages])
+    # Each task parses its page as soon as it lands, so only in-flight bodies are held in memory
+    results = await asyncio.gather(*(fetch_and_parse(u) for u in review_urls))
 
-        # Filter None and dedupe by URL
-        out = {}
-        for item in parsed:
-            if not item:
-                continue
-            out[item["review_url"]] = item
-
-        return list(out.values()), "success"
+    # Filter None and dedupe by URL
+    out = {item["review_url"]: item for item in results if item}
+    return list(out.values()), "success"
 
 
 def get_liked_reviews_data(username: str):
     return asyncio.run(get_user_liked_reviews(username))
 
 
-def reviews_liked_from_user(user: str):
-    liked_reviews, status = get_liked_reviews_data(username)
+async def reviews_liked_from_user_async(user: str, session: ClientSession | None = None):
+    liked_reviews, status = await get_user_liked_reviews(user, session)
 
     if status:
         return Counter([review["reviewer"] for review in liked_reviews]), True
@@ -336,6 +282,10 @@ def reviews_liked_from_user(user: str):
         return [], False
 
 
+def reviews_liked_from_user(user: str):
+    return asyncio.run(reviews_liked_from_user_async(user))
+
+
 # -----------------------
 # Run (consistent style)
 # -----------------------
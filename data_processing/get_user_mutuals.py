@@ -1,73 +1,48 @@
 import asyncio
+import re
 import sys
+from functools import partial
 from pathlib import Path
-import re
 
-from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
+from aiohttp import ClientSession
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from data_processing.utils.http_utils import BROWSER_HEADERS, default_request_timeout
-
-
-async def fetch(url: str, session: ClientSession) -> bytes | None:
-    try:
-        async with session.get(url, timeout=ClientTimeout(total=default_request_timeout)) as r:
-            return await r.read()
-    except Exception:
-        return None
-
+from data_processing.utils.http_utils import crawl_pages, with_session
+from data_processing.utils.selectors import LBX_RESERVED_USER_PATHS
 
-def get_page_count_from_html(html: bytes) -> int:
-    """Find last pagination number (fallback to 1)."""
-    soup = BeautifulSoup(html, "lxml")
+# Profile links on people pages: <a ... href="/username/" ...>
+_USER_HREF_RE = re.compile(rb"<a\b[^>]*\bhref=[\"']/([A-Za-z0-9_][A-Za-z0-9_-]{0,29})/[\"'][^>]*>")
 
-    pages = []
-    for a in soup.select("div.paginate-pages a"):
-        t = (a.get_text() or "").strip()
-        if t.isdigit():
-            pages.append(int(t))
-    if pages:
-        return max(pages)
 
-    # fallback: rel="last"
-    last = soup.select_one('link[rel="last"]')
-    if last and last.get("href"):
-        m = re.search(r"/page/(\d+)/", last["href"])
-        if m:
-            return int(m.group(1))
-
-    return 1
-
-
-def parse_people_page(html: bytes) -> list[str]:
+def parse_people_page(html: bytes, whole_page_fallback: bool = False) -> set[str]:
     """
     Extract usernames from a followers/following page.
-    Tries table links first, then a general fallback.
+    Scans the person table's bytes for <a href="/username/">. With no table, the
+    whole page is scanned only if whole_page_fallback is set; only do that for a
+    page known to exist, since past-the-end pages would yield site-nav links.
     """
-    soup = BeautifulSoup(html, "lxml")
-    usernames: set[str] = set()
+    start = html.find(b"<table")
+    end = html.rfind(b"</table>")
+    if start != -1 and end > start:
+        scope = html[start:end]
+    elif whole_page_fallback:
+        scope = html
+    else:
+        return set()
 
-    # Common Letterboxd markup: "person-table"
-    for a in soup.select("table a[href^='/'][href$='/']"):
-        href = a.get("href", "")
-        if href.count("/") == 2:  # "/username/"
-            usernames.add(href.strip("/"))
-
-    # Fallback if markup differs
-    if not usernames:
-        for a in soup.select("a[href^='/'][href$='/']"):
-            href = a.get("href", "")
-            if href.count("/") == 2:
-                usernames.add(href.strip("/"))
+    usernames: set[str] = set()
+    for m in _USER_HREF_RE.finditer(scope):
+        name = m.group(1).decode()
+        if name.lower() not in LBX_RESERVED_USER_PATHS:
+            usernames.add(name)
 
-    return sorted(usernames)
+    return usernames
 
 
-async def get_all_people(username: str, kind: str) -> list[str]:
+async def get_all_people(username: str, kind: str, session: ClientSession) -> set[str]:
     """
     kind: "followers" or "following"
     """
@@ -76,52 +51,40 @@ async def get_all_people(username: str, kind: str) -> list[str]:
 
     base = f"https://letterboxd.com/{username}/{kind}/"
 
-    async with ClientSession(headers=BROWSER_HEADERS, connector=TCPConnector(limit=6)) as session:
-        first_html = await fetch(base, session)
-        if not first_html:
-            return []
-
-        if b"Page not found" in first_html:
-            return []
-
-        num_pages = get_page_count_from_html(first_html)
-
-        # page 1 is base; subsequent pages are /page/N/
-        tasks = [fetch(base, session)]
-        for p in range(2, num_pages + 1):
-            tasks.append(fetch(f"https://letterboxd.com/{username}/{kind}/page/{p}/", session))
-
-        pages = await asyncio.gather(*tasks)
-
-    people: set[str] = set()
-    for html in pages:
-        if html:
-            people.update(parse_people_page(html))
-
-    return sorted(people)
+    # No page-count probe: pages are fetched in speculative batches until one comes back empty
+    people = await crawl_pages(
+        base, session, parse_people_page,
+        parse_first=partial(parse_people_page, whole_page_fallback=True),
+    )
+    # The profile owner's own link appears in the page chrome; hrefs are lowercase
+    owner = username.lower()
+    return {p for p in people if p.lower() != owner}
 
 
-async def get_followers(username: str) -> list[str]:
-    return await get_all_people(username, "followers")
+async def get_followers(username: str, session: ClientSession) -> set[str]:
+    return await get_all_people(username, "followers", session)
 
 
-async def get_following(username: str) -> list[str]:
-    return await get_all_people(username, "following")
+async def get_following(username: str, session: ClientSession) -> set[str]:
+    return await get_all_people(username, "following", session)
 
 
-def get_mutuals(followers: list[str], following: list[str]) -> list[str]:
+def get_mutuals(followers: set[str], following: set[str]) -> set[str]:
     """Intersection of followers + following."""
-    return sorted(set(followers) & set(following))
+    return followers & following
 
 
-async def get_mutuals_for_user(username: str) -> tuple[list[str], list[str], list[str]]:
+@with_session
+async def get_mutuals_for_user(
+    username: str, session: ClientSession
+) -> tuple[set[str], set[str], set[str]]:
     """
     Returns (followers, following, mutuals)
-    Fetches followers+following concurrently.
+    Fetches followers+following concurrently over one shared session.
     """
     followers, following = await asyncio.gather(
-        get_followers(username),
-        get_following(username),
+        get_followers(username, session),
+        get_following(username, session),
     )
     mutuals = get_mutuals(followers, following)
     return followers, following, mutuals
@@ -139,5 +102,5 @@ if __name__ == "__main__":
     # for u in following: print(u)
 
     print(f"mutuals_count: {len(mutuals)}")
-    for u in mutuals:
+    for u in sorted(mutuals):
         print(u)
\ No newline at end of file
@@ -5,111 +5,104 @@ import sys
 from pathlib import Path
 from itertools import chain
 
-from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
+from aiohttp import ClientSession
+from lxml import etree
 
 # Make project imports work whether executed from repo root or elsewhere
 PROJECT_ROOT = Path(__file__).resolve().parents[1]  # .../Letterboxd Taste Comparer
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from data_processing.utils.http_utils import BROWSER_HEADERS, default_request_timeout
-from data_processing.utils.selectors import LBX_REVIEW_TILE
-from data_processing.utils.utils import get_page_count
+from data_processing.utils.http_utils import (
+    FetchFailedError,
+    fetch_listing,
+    parse_lxml,
+    with_session,
+    xpath_class,
+)
 
 
 LBX_BASE = "https://www.letterboxd.com"
 
+# Compiled once; every ratings/reviews page reuses them
+_LAZY_POSTER = f"div[{xpath_class('react-component')} and @data-component-class='LazyPoster']"
+_XP_TILES = etree.XPath(f"//li[{xpath_class('griditem')}]")
+_XP_POSTERS = etree.XPath(f"//{_LAZY_POSTER}")
+_XP_TILE_POSTER = etree.XPath(f".//{_LAZY_POSTER}")
+_XP_RATING = etree.XPath(f".//span[{xpath_class('rating')}]")
+_XP_VIEWINGDATA = etree.XPath(f".//*[{xpath_class('poster-viewingdata')}]")
+_XP_LIKED = etree.XPath(
+    f".//*[{xpath_class('liked')} or {xpath_class('icon-liked')}]"
+    f" | .//span[{xpath_class('like')}]"
+)
 
-async def fetch(url, session, input_data=None):
-    if input_data is None:
-        input_data = {}
-    async with session.get(url, timeout=ClientTimeout(total=default_request_timeout)) as response:
-        try:
-            return await response.read(), input_data
-        except Exception:
-            return None, None
+
+# rated-5 .. rated-50 in steps of 5 -> 0.5 .. 5.0; any other rated-* class is unrated
+_RATED_CLASSES = {f"rated-{n}": n / 10 for n in range(5, 55, 5)}
 
 
 def _parse_rating_from_class(class_list) -> float:
     if not class_list:
         return -1
     for c in class_list:
-        if isinstance(c, str) and c.startswith("rated-"):
-            try:
-                n = int(c.split("-", 1)[1])
-                if n < 5 or n > 50 or (n % 5 != 0):
-                    return -1
-                return n / 10
-            except Exception:
-                return -1
+        if c.startswith("rated-"):
+            return _RATED_CLASSES.get(c, -1)
     return -1
 
 
 def _parse_rating_text(text: str) -> float:
-    if not text:
-        return -1
-    t = text.strip()
-    if "★" not in t:
+    # raw node text: count() doesn't care about surrounding whitespace
+    if not text or "★" not in text:
         return -1
-    stars = t.count("★")
-    if "½" in t:
+    stars = text.count("★")
+    if "½" in text:
         stars += 0.5
     return stars
 
 
-def _normalize_possible_fraction(val: float) -> float:
-    try:
-        if 0 <= val <= 1:
-            return round(val * 5, 1)
-    except Exception:
-        pass
-    return val
-
-
-async def parse_ratings_page(response):
-    if not response or not response[0]:
+def parse_ratings_page(html: bytes):
+    if not html:
         return []
 
-    soup = BeautifulSoup(response[0], "lxml")
-    tiles = soup.find_all(*LBX_REVIEW_TILE)
+    tree = parse_lxml(html)
+    tiles = _XP_TILES(tree)
 
     out = []
     for tile in tiles:
-        poster_rc = tile.select_one('div.react-component[data-component-class="LazyPoster"]')
-        if not poster_rc:
+        posters = _XP_TILE_POSTER(tile)
+        if not posters:
             continue
+        attrs = posters[0].attrib
 
-        movie_id = poster_rc.get("data-item-slug") or poster_rc.get("data-film-slug")
+        movie_id = attrs.get("data-item-slug") or attrs.get("data-film-slug")
         if not movie_id:
             continue
 
         display_name = (
-            poster_rc.get("data-item-full-display-name")
-            or poster_rc.get("data-item-name")
+            attrs.get("data-item-full-display-name")
+            or attrs.get("data-item-name")
             or movie_id
         )
 
         rating_val = -1
 
-        rating_el = tile.select_one("span.rating[class*='rated-']")
-        if not rating_el:
-            rating_el = tile.select_one("span.rating")
+        ratings = _XP_RATING(tile)
+        rating_el = next((el for el in ratings if "rated-" in el.get("class", "")), None)
+        if rating_el is None and ratings:
+            rating_el = ratings[0]
 
-        if rating_el:
-            rating_val = _parse_rating_from_class(rating_el.get("class", []))
+        if rating_el is not None:
+            rating_val = _parse_rating_from_class(rating_el.get("class", "").split())
             if rating_val == -1:
-                rating_val = _parse_rating_text(rating_el.get_text(" ", strip=True))
+                rating_val = _parse_rating_text(rating_el.text_content())
 
         if rating_val == -1:
-            vd = tile.select_one(".poster-viewingdata, p.poster-viewingdata")
+            vd = _XP_VIEWINGDATA(tile)
             if vd:
-                rating_val = _parse_rating_text(vd.get_text(" ", strip=True))
-
-        rating_val = _normalize_possible_fraction(rating_val)
+                rating_val = _parse_rating_text(vd[0].text_content())
 
         liked = False
-        if tile.select_one(".liked") or tile.select_one("span.like") or tile.select_one(".icon-liked"):
+        if _XP_LIKED(tile):
             liked = True
 
         out.append(
@@ -125,81 +118,67 @@ async def parse_ratings_page(response):
 
 
 # ✅ CHANGED: reviews page parser no longer uses LBX_REVIEW_TILE
-async def parse_reviewed_films_page(response):
+def parse_reviewed_films_page(html: bytes):
     """
-    Parse a /films/reviews/ page and return a set of film slugs the user has reviewed.
+    Parse a /films/reviews/ page and return the film slugs the user has reviewed.
 
     ✅ Uses LazyPoster components directly because /films/reviews/ markup
     doesn't always match LBX_REVIEW_TILE.
     """
-    if not response or not response[0]:
-        return set()
+    if not html:
+        return []
 
-    soup = BeautifulSoup(response[0], "lxml")
+    tree = parse_lxml(html)
 
-    reviewed = set()
-    for rc in soup.select('div.react-component[data-component-class="LazyPoster"]'):
-        slug = rc.get("data-item-slug") or rc.get("data-film-slug")
+    reviewed = []
+    for rc in _XP_POSTERS(tree):
+        attrs = rc.attrib
+        slug = attrs.get("data-item-slug") or attrs.get("data-film-slug")
         if slug:
-            reviewed.add(slug)
+            reviewed.append(slug)
 
     return reviewed
 
 
-async def get_user_ratings(username: str, num_pages: int, session: ClientSession):
-    url = f"{LBX_BASE}/{{}}/films/ratings/page/{{}}/"
-    tasks = [
-        asyncio.ensure_future(fetch(url.format(username, i + 1), session, {"username": username}))
-        for i in range(num_pages)
-    ]
-    scrape_responses = await asyncio.gather(*tasks)
-    scrape_responses = [x for x in scrape_responses if x and x[0]]
-
-    parse_tasks = [asyncio.ensure_future(parse_ratings_page(r)) for r in scrape_responses]
-    parse_responses = await asyncio.gather(*parse_tasks)
-    return list(chain.from_iterable(parse_responses))
+async def get_user_ratings(username: str, session: ClientSession):
+    """
+    Rated films across all ratings pages; None if the user doesn't exist.
+    Raises FetchFailedError if the first page can't be loaded.
+    """
+    pages = await fetch_listing(f"{LBX_BASE}/{username}/films/ratings/", session, parse_ratings_page)
+    if pages is None:
+        return None
+    return list(chain.from_iterable(pages))
 
 
 async def get_user_reviewed_films_set(username: str, session: ClientSession) -> set[str]:
-    # ✅ CHANGED: still uses get_page_count, but parsing is now robust
-    num_pages, _ = get_page_count(username, url=f"{LBX_BASE}/{{}}/films/reviews")
-    if num_pages == -1:
+    reviewed_sets = await fetch_listing(
+        f"{LBX_BASE}/{username}/films/reviews/", session, parse_reviewed_films_page
+    )
+    if reviewed_sets is None:
         return set()
 
-    # Always fetch page 1 via the base URL
-    page_urls = [f"{LBX_BASE}/{username}/films/reviews/"]
-    for p in range(2, num_pages + 1):
-        page_urls.append(f"{LBX_BASE}/{username}/films/reviews/page/{p}/")
-
-    tasks = [
-        asyncio.ensure_future(fetch(u, session, {"username": username, "page": idx + 1}))
-        for idx, u in enumerate(page_urls)
-    ]
-    scrape_responses = await asyncio.gather(*tasks)
-    scrape_responses = [x for x in scrape_responses if x and x[0]]
-
-    parse_tasks = [asyncio.ensure_future(parse_reviewed_films_page(r)) for r in scrape_responses]
-    reviewed_sets = await asyncio.gather(*parse_tasks)
-
-    reviewed = set()
-    for s in reviewed_sets:
-        reviewed |= s
-    return reviewed
-
-
-async def get_user_ratings_enriched(username: str):
-    num_pages, _ = get_page_count(username, url=f"{LBX_BASE}/{{}}/films/ratings")
-    if num_pages == -1:
+    # one C-level set build over every page's slugs, no per-page unions
+    return set(chain.from_iterable(reviewed_sets))
+
+
+@with_session
+async def get_user_ratings_enriched(username: str, session: ClientSession):
+    # No separate page-count probe: both listings start from their own page 1.
+    # Let both finish before reporting a failure so neither outlives the session.
+    films, reviewed_set = await asyncio.gather(
+        get_user_ratings(username, session),
+        get_user_reviewed_films_set(username, session),
+        return_exceptions=True,
+    )
+    for result in (films, reviewed_set):
+        if isinstance(result, FetchFailedError):
+            return [], "fetch_failed"
+        if isinstance(result, BaseException):
+            raise result
+    if films is None:
         return [], "user_not_found"
 
-    connector = TCPConnector(limit=6, ttl_dns_cache=3600)
-
-    async with ClientSession(headers=BROWSER_HEADERS, connector=connector) as session:
-        ratings_task = asyncio.create_task(get_user_ratings(username, num_pages=num_pages, session=session))
-        reviewed_task = asyncio.create_task(get_user_reviewed_films_set(username, session=session))
-
-        films, reviewed_set = await asyncio.gather(ratings_task, reviewed_task)
-
     for f in films:
         f["has_review"] = f["movie_id"] in reviewed_set
 
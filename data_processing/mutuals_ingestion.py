@@ -1,16 +1,52 @@
 import asyncio
+import sys
+from pathlib import Path
+
 import get_user_film
 import get_user_liked_reviews
 import get_user_mutuals
 
-def get_mutuals_ingestion(user):
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from data_processing.utils.http_utils import make_session
+
+# Users scraped at once; each one already fans out over many pages,
+# and the session's per-host limit caps the real connection count
+max_concurrent_users = 8
+
 
-    user_film, user_film_status = get_user_film(user)
-    liked_reviews, liked_reviews_status = get_user_liked_reviews.reviews_liked_from_user(user)
+async def ingest_user(user, session):
+    (user_film, user_film_status), (liked_reviews, liked_reviews_status) = await asyncio.gather(
+        get_user_film.get_user_film_async(user, session),
+        get_user_liked_reviews.reviews_liked_from_user_async(user, session),
+    )
+    return user_film, user_film_status, liked_reviews, liked_reviews_status
 
-    followers, following, mutuals = asyncio.run(get_user_mutuals.get_mutuals_for_user(user))
 
-    for mutal in mutuals:
-        user_film, user_film_status = get_user_film(mutal)
-        liked_reviews, liked_reviews_status = get_user_liked_reviews.reviews_liked_from_user(mutal)
+async def get_mutuals_ingestion_async(user):
+    """
+    Scrapes the user and every mutual over one shared session.
+    Returns {username: (user_film, user_film_status, liked_reviews, liked_reviews_status)}.
+    """
+    async with make_session() as session:
+        sem = asyncio.Semaphore(max_concurrent_users)
 
+        async def bounded(u):
+            async with sem:
+                return u, await ingest_user(u, session)
+
+        # the user's own scrape doesn't need the mutuals list, so start it right away
+        user_task = asyncio.create_task(bounded(user))
+        try:
+            followers, following, mutuals = await get_user_mutuals.get_mutuals_for_user(user, session)
+            results = await asyncio.gather(user_task, *(bounded(m) for m in sorted(mutuals)))
+        finally:
+            user_task.cancel()
+
+    return dict(results)
+
+
+def get_mutuals_ingestion(user):
+    return asyncio.run(get_mutuals_ingestion_async(user))
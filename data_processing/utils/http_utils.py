@@ -1,3 +1,16 @@
+import asyncio
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from functools import wraps
+from typing import Awaitable, Callable, Iterable, TypeVar
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+from lxml import html as lxml_html
+from selectolax.lexbor import LexborHTMLParser
+
 BROWSER_HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
@@ -9,3 +22,373 @@ BROWSER_HEADERS = {
 }
 
 default_request_timeout = 20
+
+# Every request goes to letterboxd.com, so the per-host cap is the real concurrency limit
+max_connections = 32
+max_connections_per_host = 12
+
+# Pages requested per batch when crawling pagination without a known page count
+speculative_pages = 8
+
+# Set LBX_HTTP_CACHE to a SQLite path (e.g. .lb_cache.sqlite) to cache pages on disk between runs
+http_cache_expire_after = 3600
+
+# How long a listing's page count is trusted before page 1 has to be read first again
+page_count_ttl = 600
+page_count_cache_size = 1024
+
+# How long a 404 is trusted; pagination tails can gain entries (new followers, likes) later
+not_found_ttl = 600
+not_found_cache_size = 4096
+
+# Timeouts, dropped connections and 429/5xx answers are retried with exponential backoff
+fetch_retries = 3
+fetch_backoff = 0.25
+
+# Pages kept for conditional GETs (ETag / Last-Modified); a 304 on re-fetch reuses the stored body
+conditional_cache_size = 128
+
+T = TypeVar("T")
+
+
+def make_session() -> ClientSession:
+    """
+    ClientSession for Letterboxd scraping: browser headers, keep-alive and cached DNS.
+    With LBX_HTTP_CACHE set, responses are also cached on disk (aiohttp-client-cache).
+    """
+    cache_path = os.getenv("LBX_HTTP_CACHE")
+    if cache_path:
+        try:
+            from aiohttp_client_cache import CachedSession, SQLiteBackend
+        except ImportError:
+            raise RuntimeError("LBX_HTTP_CACHE is set but aiohttp-client-cache is not installed")
+
+    connector = TCPConnector(
+        limit=max_connections,
+        limit_per_host=max_connections_per_host,
+        ttl_dns_cache=3600,
+        keepalive_timeout=60,
+    )
+    if not cache_path:
+        return ClientSession(headers=BROWSER_HEADERS, connector=connector)
+
+    cache = SQLiteBackend(cache_path, expire_after=http_cache_expire_after, cache_control=True)
+    return CachedSession(cache=cache, headers=BROWSER_HEADERS, connector=connector)
+
+
+def with_session(fn: Callable[[str, ClientSession], Awaitable[T]]):
+    """
+    Decorator for scrapers shaped fn(username, session): the session becomes optional.
+    Pass one to reuse its connection pool; otherwise one is opened for just this call.
+    """
+    @wraps(fn)
+    async def wrapper(username: str, session: ClientSession | None = None) -> T:
+        if session is not None:
+            return await fn(username, session)
+        async with make_session() as session:
+            return await fn(username, session)
+
+    return wrapper
+
+
+def parse_html(html: bytes | str | LexborHTMLParser) -> LexborHTMLParser:
+    """
+    Build a Lexbor tree for a scraped page (much cheaper than BeautifulSoup+lxml).
+    An already-parsed tree is returned as-is, so one page can feed several parsers.
+    """
+    if isinstance(html, LexborHTMLParser):
+        return html
+    return LexborHTMLParser(html)
+
+
+# Letterboxd serves UTF-8; pinning it keeps ★/½ intact even if the meta charset is missing
+_LXML_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def parse_lxml(html: bytes):
+    """Build an lxml element tree for a scraped page (used by the poster-grid parsers)."""
+    return lxml_html.fromstring(html, parser=_LXML_PARSER)
+
+
+def xpath_class(name: str) -> str:
+    """XPath predicate body matching a whole class token, like CSS `.name`."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_LINK_LAST_RE = re.compile(rb"<link\b[^>]*\brel=[\"']last[\"'][^>]*>", re.IGNORECASE)
+_PAGE_RE = re.compile(rb"/page/(\d+)/")
+
+
+def parse_last_page(html: bytes) -> int:
+    """Find last pagination number (fallback to 1)."""
+    # <link rel="last" href=".../page/N/"> sits in <head>; no tree needed
+    link = _LINK_LAST_RE.search(html)
+    if link:
+        m = _PAGE_RE.search(link.group(0))
+        if m:
+            return int(m.group(1))
+
+    pages = []
+    for a in parse_html(html).css("div.paginate-pages a"):
+        t = a.text(strip=True)
+        if t.isdigit():
+            pages.append(int(t))
+    if pages:
+        return max(pages)
+
+    return 1
+
+
+def canonicalize_url(url: str) -> str:
+    """Remove query/fragment; keep scheme/netloc/path for stable dedupe."""
+    if not url:
+        return url
+    return url.split("?", 1)[0].split("#", 1)[0]
+
+
+# URL -> monotonic time it answered 404; oldest entries are evicted first.
+# Speculative crawls hit past-the-end pages every run, so don't re-fetch them within the TTL.
+_NOT_FOUND_URLS: OrderedDict[str, float] = OrderedDict()
+
+
+def is_known_not_found(url: str) -> bool:
+    """True if url answered 404 within the last not_found_ttl seconds."""
+    seen = _NOT_FOUND_URLS.get(url)
+    if seen is None:
+        return False
+    if time.monotonic() - seen > not_found_ttl:
+        del _NOT_FOUND_URLS[url]
+        return False
+    _NOT_FOUND_URLS.move_to_end(url)
+    return True
+
+
+def _remember_not_found(url: str) -> None:
+    _NOT_FOUND_URLS[url] = time.monotonic()
+    _NOT_FOUND_URLS.move_to_end(url)
+    if len(_NOT_FOUND_URLS) > not_found_cache_size:
+        _NOT_FOUND_URLS.popitem(last=False)
+
+
+def is_page_not_found(html: bytes) -> bool:
+    return b"Page not found" in html or b"page-not-found" in html
+
+
+_BODY_CLASS_RE = re.compile(rb"<body\b[^>]*\bclass=[\"']([^\"']*)[\"']", re.IGNORECASE)
+
+
+def is_user_not_found(html: bytes) -> bool:
+    """Unknown members (and other error pages) render as <body class="error ...">."""
+    m = _BODY_CLASS_RE.search(html)
+    return m is None or b"error" in m.group(1).split()
+
+
+def is_error_page(html: bytes) -> bool:
+    """Like is_user_not_found, but a page without a body class isn't taken as an error."""
+    m = _BODY_CLASS_RE.search(html)
+    return m is not None and b"error" in m.group(1).split()
+
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# URL -> (ETag, Last-Modified, zlib-compressed body) for pages that came with validators;
+# oldest evicted first. HTML shrinks ~6x, so the retained bodies stay small.
+_VALIDATED: OrderedDict[str, tuple[str | None, str | None, bytes]] = OrderedDict()
+
+
+def _conditional_headers(cached: tuple[str | None, str | None, bytes] | None) -> dict[str, str]:
+    if not cached:
+        return {}
+    etag, last_modified, _ = cached
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _remember_validated(url: str, etag: str | None, last_modified: str | None, html: bytes) -> None:
+    if not (etag or last_modified):
+        _VALIDATED.pop(url, None)
+        return
+    _VALIDATED[url] = (etag, last_modified, zlib.compress(html, 1))
+    _VALIDATED.move_to_end(url)
+    if len(_VALIDATED) > conditional_cache_size:
+        _VALIDATED.popitem(last=False)
+
+
+async def fetch_bytes(url: str, session: ClientSession) -> bytes | None:
+    """
+    GET a page body; None if it still fails after retries or the URL is known to 404
+    (is_known_not_found(url) tells the two apart).
+    Pages fetched before are revalidated, and a 304 returns the stored body.
+    """
+    if is_known_not_found(url):
+        return None
+
+    # keep the entry the validators came from: concurrent fetches may evict it before a 304 lands
+    cached = _VALIDATED.get(url)
+    headers = _conditional_headers(cached)
+    for attempt in range(fetch_retries):
+        if attempt:
+            await asyncio.sleep(fetch_backoff * 2 ** (attempt - 1))
+        try:
+            async with session.get(
+                url, headers=headers, timeout=ClientTimeout(total=default_request_timeout)
+            ) as r:
+                status = r.status
+                if status == 304:
+                    if cached:
+                        if url in _VALIDATED:
+                            _VALIDATED.move_to_end(url)
+                        return zlib.decompress(cached[2])
+                    # nothing to reuse: ask again unconditionally
+                    headers = {}
+                    continue
+                if status in _RETRY_STATUSES:
+                    continue
+                html = await r.read()
+                etag = r.headers.get("ETag")
+                last_modified = r.headers.get("Last-Modified")
+        except (ClientError, asyncio.TimeoutError):
+            continue
+        except Exception:
+            return None
+        break
+    else:
+        return None
+
+    # 404 is permanent (missing user, past the last page): remember it, don't retry
+    if status == 404:
+        _remember_not_found(url)
+    elif status == 200:
+        _remember_validated(url, etag, last_modified, html)
+    return html
+
+
+def build_paged_url(base: str, page: int) -> str:
+    return base if page <= 1 else f"{base}page/{page}/"
+
+
+async def crawl_pages(
+    base: str,
+    session: ClientSession,
+    parse: Callable[[bytes], Iterable[str]],
+    batch_size: int = speculative_pages,
+    parse_first: Callable[[bytes], Iterable[str]] | None = None,
+) -> set[str]:
+    """
+    Fetch base, base/page/2/, ... in concurrent batches of batch_size, parsing
+    each page as it arrives, and return the union of everything parsed.
+    parse_first, if given, parses page 1 (the one page known to exist) instead of parse.
+    Stops after the first batch that reaches the end of the list: a page that is
+    missing (404 / error page) or adds nothing new. A page that still fails
+    after retries is skipped; the crawl only gives up if a whole batch fails.
+    """
+    async def fetch(url: str) -> tuple[str, bytes | None]:
+        return url, await fetch_bytes(url, session)
+
+    found: set[str] = set()
+    first = 1
+    while True:
+        urls = [build_paged_url(base, p) for p in range(first, first + batch_size)]
+        exhausted = False
+        loaded = False
+        for fut in asyncio.as_completed([fetch(u) for u in urls]):
+            url, html = await fut
+            if is_known_not_found(url) or (html and is_error_page(html)):
+                exhausted = True
+                continue
+            if not html:
+                # lose this page, not the rest of the list
+                continue
+            loaded = True
+            items = set((parse_first if parse_first and url == base else parse)(html))
+            if items <= found:
+                exhausted = True
+                continue
+            found |= items
+
+        if exhausted or not loaded:
+            return found
+        first += batch_size
+
+
+# Listing URL -> (monotonic time seen, page count); oldest entries are evicted first
+_PAGE_COUNTS: OrderedDict[str, tuple[float, int]] = OrderedDict()
+
+
+def _cached_page_count(base: str) -> int | None:
+    hit = _PAGE_COUNTS.get(base)
+    if hit is None:
+        return None
+    seen, num_pages = hit
+    if time.monotonic() - seen > page_count_ttl:
+        del _PAGE_COUNTS[base]
+        return None
+    _PAGE_COUNTS.move_to_end(base)
+    return num_pages
+
+
+def _remember_page_count(base: str, num_pages: int) -> None:
+    _PAGE_COUNTS[base] = (time.monotonic(), num_pages)
+    _PAGE_COUNTS.move_to_end(base)
+    if len(_PAGE_COUNTS) > page_count_cache_size:
+        _PAGE_COUNTS.popitem(last=False)
+
+
+class FetchFailedError(Exception):
+    """A listing's first page still failed to load after retries; the user may well exist."""
+
+
+async def fetch_listing(
+    base: str,
+    session: ClientSession,
+    parse: Callable[[bytes], T],
+) -> list[T] | None:
+    """
+    Fetch and parse every page of a paginated listing whose first page is base.
+
+    Page 1 is fetched as data and its pagination gives the page count, so there's
+    no separate probe request. A count seen within page_count_ttl lets the other
+    pages go out alongside page 1. Parsing runs in worker threads.
+
+    Returns None if the user doesn't exist (page 1 is a 404 or an error page).
+    Raises FetchFailedError if page 1 can't be loaded; later pages that fail are skipped.
+    """
+    async def fetch_page(page: int) -> T | None:
+        html = await fetch_bytes(build_paged_url(base, page), session)
+        if not html or is_error_page(html):
+            return None
+        return await asyncio.to_thread(parse, html)
+
+    async def fetch_first() -> tuple[T | None, int]:
+        html = await fetch_bytes(base, session)
+        if not html:
+            if is_known_not_found(base):
+                return None, 0
+            raise FetchFailedError(base)
+        if is_user_not_found(html):
+            return None, 0
+        # read the count first so nothing needs the body once the parser has it
+        num_pages = parse_last_page(html)
+        return await asyncio.to_thread(parse, html), num_pages
+
+    known = _cached_page_count(base) or 1
+    tasks = {p: asyncio.create_task(fetch_page(p)) for p in range(2, known + 1)}
+    try:
+        first, num_pages = await fetch_first()
+        if first is None:
+            return None
+        _remember_page_count(base, num_pages)
+        # the listing may have grown since its count was remembered
+        for p in range(known + 1, num_pages + 1):
+            tasks[p] = asyncio.create_task(fetch_page(p))
+        pages = await asyncio.gather(*(tasks[p] for p in range(2, num_pages + 1)))
+    finally:
+        # missing user, shrunken listing or cancellation: don't leave fetches running
+        for t in tasks.values():
+            t.cancel()
+
+    return [first, *(page for page in pages if page is not None)]
@@ -12,3 +12,11 @@ LBX_USER_RATINGS_PAGE_LINKS = "li.paginate-page a"
 LBX_REVIEW_TILE = ("li", {"class": "griditem"})
 LBX_REVIEW_RATING = ("span", {"class": "rating"})
 LBX_REVIEW_LIKED = ("span", {"class": "like icon-liked"})
+
+# Top-level Letterboxd paths that look like /<username>/ but aren't members
+LBX_RESERVED_USER_PATHS = frozenset({
+    "film", "films", "review", "reviews", "likes", "activity", "journal",
+    "search", "lists", "members", "about", "contact", "settings", "sign-in",
+    "sign-up", "login", "logout", "create-account", "welcome", "pro", "apps",
+    "legal", "podcast", "year-in-review",
+})
@@ -1,13 +1,32 @@
 import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
-import psycopg
+from psycopg_pool import ConnectionPool
 
 load_dotenv()
 
+# Opened on first use so importing db.* never touches the network
+_POOL = None
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        url = os.getenv("DATABASE_URL")
+        if not url:
+            raise RuntimeError("DATABASE_URL not set. Put it in .env")
+        _POOL = ConnectionPool(url, min_size=2, max_size=10, kwargs={"autocommit": False}, open=True)
+    return _POOL
+
+
+@contextmanager
 def get_conn():
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        raise RuntimeError("DATABASE_URL not set. Put it in .env")
-    return psycopg.connect(url)
+    """Borrow a pooled connection; it goes back to the pool when the block exits."""
+    with get_pool().connection() as conn:
+        yield conn
+
 
-print(get_conn())
\ No newline at end of file
+if __name__ == "__main__":
+    # Smoke test: borrow one connection and hand it straight back
+    with get_conn() as c:
+        print(c)
@@ -7,12 +7,11 @@ def run_schema(schema_path: str = "sql/schema.sql"):
     full_path = project_root / schema_path                 # .../schema.sql
 
     sql_text = full_path.read_text(encoding="utf-8")
-    statements = [s.strip() for s in sql_text.split(";") if s.strip()]
 
+    # No parameters, so psycopg sends the whole script in one round trip;
+    # the server does the statement splitting (dollar-quoted bodies stay intact)
     with get_conn() as conn:
-        with conn.cursor() as cur:   # NOTE: cursor() not cursor
-            for stmt in statements:
-                cur.execute(stmt)
+        conn.execute(sql_text)
         conn.commit()
 
 if __name__ == "__main__":
@@ -14,17 +14,21 @@ from db.connect import get_conn
 
 _SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
 
+# filename -> statement text; each file is read from disk once per process
+_SQL_CACHE: dict[str, str] = {}
+
 
 def load_sql(filename: str) -> str:
-    path = _SQL_DIR / filename
-    return path.read_text(encoding="utf-8")
+    sql = _SQL_CACHE.get(filename)
+    if sql is None:
+        sql = _SQL_CACHE[filename] = (_SQL_DIR / filename).read_text(encoding="utf-8")
+    return sql
 
 
 def _try_load_sql(filename: str) -> Optional[str]:
-    path = _SQL_DIR / filename
-    if not path.exists():
+    if filename not in _SQL_CACHE and not (_SQL_DIR / filename).exists():
         return None
-    return path.read_text(encoding="utf-8")
+    return load_sql(filename)
 
 
 # ----------------------------
@@ -53,6 +57,120 @@ DELETE_FILM_JOINS = load_sql("delete_film_joins.sql")
 UPSERT_USER_MUTUAL = _try_load_sql("upsert_user_mutual.sql")
 
 
+# ----------------------------
+# Bulk load (COPY -> temp table -> one upsert)
+# ----------------------------
+
+FILM_COLUMNS = (
+    "movie_id", "film_name", "release_year", "release_date", "runtime_minutes",
+    "original_language", "overview", "poster_path", "backdrop_path",
+    "tmdb_id", "tmdb_type", "imdb_id", "tmdb_vote_average", "tmdb_vote_count",
+)
+USER_FILM_COLUMNS = (
+    "username", "movie_id", "watched", "in_watchlist", "rating_val", "liked", "has_review",
+)
+FILM_GENRE_COLUMNS = ("movie_id", "genre_id")
+FILM_KEYWORD_COLUMNS = ("movie_id", "keyword_id")
+FILM_CAST_COLUMNS = ("movie_id", "person_id", "cast_order")
+FILM_CREW_COLUMNS = ("movie_id", "person_id", "job", "department")
+
+
+def _copy_to_temp(cur, table: str, columns: tuple[str, ...], rows: Iterable[tuple]) -> None:
+    """
+    Streams rows with COPY into tmp_<table>, a temp copy of `table` that is dropped
+    on commit (so at most once per table per transaction).
+    """
+    tmp = f"tmp_{table}"
+    cur.execute(f"CREATE TEMP TABLE {tmp} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+    with cur.copy(f"COPY {tmp} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def _copy_merge(cur, table: str, columns: tuple[str, ...],
+                rows: Iterable[tuple], merge_sql: str) -> None:
+    """
+    COPYs rows into tmp_<table>, then runs merge_sql
+    (INSERT ... SELECT FROM tmp_<table> ON CONFLICT ...) once for the whole batch.
+    """
+    _copy_to_temp(cur, table, columns, rows)
+    cur.execute(merge_sql)
+
+
+# ----------------------------
+# Row builders
+# ----------------------------
+
+def _clean_movie_id(movie_id: Any) -> Optional[str]:
+    """The movie_id as stored, or None if it can't be a Letterboxd slug (empty, or a scraped path)."""
+    mid = "" if movie_id is None else str(movie_id)
+    if not mid or "/" in mid:
+        return None
+    return mid
+
+
+def _user_values(username: str, display_name: Optional[str], reviews_written: int) -> tuple:
+    # last_fetched_at is stamped by the database (see upsert_user.sql)
+    return (username, display_name, int(reviews_written))
+
+
+def _film_values(films: Mapping[str, Mapping[str, Any]]) -> list[tuple]:
+    # keyed by movie_id: ON CONFLICT DO UPDATE can't touch the same row twice in one statement
+    values = {}
+    for movie_id, meta in films.items():
+        movie_id = _clean_movie_id(movie_id)
+        if movie_id is None:
+            continue
+        values[movie_id] = (
+            movie_id,
+            meta.get("film_name"),
+            meta.get("release_year"),
+            meta.get("release_date"),
+            meta.get("runtime_minutes"),
+            meta.get("original_language"),
+            meta.get("overview"),
+            meta.get("poster_path"),
+            meta.get("backdrop_path"),
+            meta.get("tmdb_id"),
+            meta.get("tmdb_type"),
+            meta.get("imdb_id"),
+            meta.get("tmdb_vote_average"),
+            meta.get("tmdb_vote_count"),
+        )
+    return list(values.values())
+
+
+def _user_film_values(username: str, rows: Iterable[dict]) -> list[tuple]:
+    # last row wins per movie_id, same as the old row-by-row upsert
+    values = {}
+    for r in rows:
+        movie_id = _clean_movie_id(r["movie_id"])
+        if movie_id is None:
+            continue
+        values[movie_id] = (
+            username,
+            movie_id,
+            bool(r["watched"]),
+            bool(r["in_watchlist"]),
+            None if r.get("rating_val") is None else float(r["rating_val"]),
+            bool(r.get("liked", False)),        # liked is NOT NULL in schema
+            bool(r.get("has_review", False)),
+        )
+    return list(values.values())
+
+
+def _liked_count_values(liker_username: str,
+                        counts: dict[str, int] | list[dict]) -> list[tuple]:
+    values = []
+    if isinstance(counts, dict):
+        for author, cnt in counts.items():
+            values.append((liker_username, author, int(cnt)))
+    else:
+        for item in counts:
+            values.append((liker_username, item["author_username"], int(item["liked_count"])))
+    return values
+
+
 # ----------------------------
 # Core upserts
 # ----------------------------
@@ -63,10 +181,9 @@ def upsert_user(username: str,
     """
     Upserts a user row. (reviews_written is required by schema, defaults to 0)
     """
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(UPSERT_USER, (username, display_name, int(reviews_written), now))
+            cur.execute(UPSERT_USER, _user_values(username, display_name, reviews_written))
         conn.commit()
 
 
@@ -81,31 +198,13 @@ def upsert_films(films: Mapping[str, Mapping[str, Any]]) -> None:
 
     You can pass only what you have; missing values can be None.
     """
-    values = []
-    for movie_id, meta in films.items():
-        values.append((
-            str(movie_id),
-            meta.get("film_name"),
-            meta.get("release_year"),
-            meta.get("release_date"),
-            meta.get("runtime_minutes"),
-            meta.get("original_language"),
-            meta.get("overview"),
-            meta.get("poster_path"),
-            meta.get("backdrop_path"),
-            meta.get("tmdb_id"),
-            meta.get("tmdb_type"),
-            meta.get("imdb_id"),
-            meta.get("tmdb_vote_average"),
-            meta.get("tmdb_vote_count"),
-        ))
-
+    values = _film_values(films)
     if not values:
         return
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(UPSERT_FILM, values)
+            _copy_merge(cur, "films", FILM_COLUMNS, values, UPSERT_FILM)
         conn.commit()
 
 
@@ -116,24 +215,13 @@ def upsert_user_films(username: str, rows: list[dict]) -> None:
     Each row must contain:
       movie_id, watched, in_watchlist, rating_val, liked, has_review
     """
-    values = []
-    for r in rows:
-        values.append((
-            username,
-            str(r["movie_id"]),
-            bool(r["watched"]),
-            bool(r["in_watchlist"]),
-            None if r.get("rating_val") is None else float(r["rating_val"]),
-            bool(r.get("liked", False)),        # liked is NOT NULL in schema
-            bool(r.get("has_review", False)),
-        ))
-
+    values = _user_film_values(username, rows)
     if not values:
         return
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(UPSERT_USER_FILMS, values)
+            _copy_merge(cur, "user_films", USER_FILM_COLUMNS, values, UPSERT_USER_FILMS)
         conn.commit()
 
 
@@ -142,14 +230,7 @@ def upsert_liked_review_counts(liker_username: str,
     """
     Upserts aggregated counts: liker_username -> author_username -> liked_count
     """
-    values = []
-    if isinstance(counts, dict):
-        for author, cnt in counts.items():
-            values.append((liker_username, author, int(cnt)))
-    else:
-        for item in counts:
-            values.append((liker_username, item["author_username"], int(item["liked_count"])))
-
+    values = _liked_count_values(liker_username, counts)
     if not values:
         return
 
@@ -159,6 +240,44 @@ def upsert_liked_review_counts(liker_username: str,
         conn.commit()
 
 
+def ingest_user_bundle(username: str,
+                       display_name: Optional[str],
+                       reviews_written: int,
+                       films: Mapping[str, Mapping[str, Any]],
+                       user_film_rows: list[dict],
+                       liked_counts: dict[str, int] | list[dict]) -> None:
+    """
+    Writes everything scraped for one user (user row, films, user_films,
+    liked-review counts) on one connection in a single transaction.
+
+    Same inputs as the individual upsert_* functions, but one commit instead of four.
+    """
+    film_values = _film_values(films)
+    user_film_values = _user_film_values(username, user_film_rows)
+    count_values = _liked_count_values(username, liked_counts)
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # COPY can't run inside a pipeline, so stage the bulk rows first
+            # (temp tables carry no foreign keys, order doesn't matter here)
+            if film_values:
+                _copy_to_temp(cur, "films", FILM_COLUMNS, film_values)
+            if user_film_values:
+                _copy_to_temp(cur, "user_films", USER_FILM_COLUMNS, user_film_values)
+
+            # then send every upsert back to back without waiting on each reply;
+            # user and films first: user_films references both
+            with conn.pipeline():
+                cur.execute(UPSERT_USER, _user_values(username, display_name, reviews_written))
+                if film_values:
+                    cur.execute(UPSERT_FILM)
+                if user_film_values:
+                    cur.execute(UPSERT_USER_FILMS)
+                if count_values:
+                    cur.executemany(UPSERT_LIKED_COUNTS, count_values)
+        conn.commit()
+
+
 # ----------------------------
 # Lookup tables (genre/keyword/person)
 # ----------------------------
@@ -260,7 +379,7 @@ def insert_film_genres(movie_id: str, genre_ids: Iterable[int]) -> None:
         return
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(INSERT_FILM_GENRE, values)
+            _copy_merge(cur, "film_genres", FILM_GENRE_COLUMNS, values, INSERT_FILM_GENRE)
         conn.commit()
 
 
@@ -270,7 +389,7 @@ def insert_film_keywords(movie_id: str, keyword_ids: Iterable[int]) -> None:
         return
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(INSERT_FILM_KEYWORD, values)
+            _copy_merge(cur, "film_keywords", FILM_KEYWORD_COLUMNS, values, INSERT_FILM_KEYWORD)
         conn.commit()
 
 
@@ -296,15 +415,16 @@ def insert_film_cast(movie_id: str, cast: Iterable[dict]) -> None:
     cast items like:
       {"person_id": 287, "cast_order": 0}
     """
-    values = []
+    values = {}
     for c in cast:
-        values.append((movie_id, int(c["person_id"]), c.get("cast_order")))
+        pid = int(c["person_id"])
+        values[pid] = (movie_id, pid, c.get("cast_order"))
     if not values:
         return
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(INSERT_FILM_CAST, values)
+            _copy_merge(cur, "film_cast", FILM_CAST_COLUMNS, values.values(), INSERT_FILM_CAST)
         conn.commit()
 
 
@@ -313,15 +433,16 @@ def insert_film_crew(movie_id: str, crew: Iterable[dict]) -> None:
     crew items like:
       {"person_id": 525, "job": "Director", "department": "Directing"}
     """
-    values = []
+    values = {}
     for c in crew:
-        values.append((movie_id, int(c["person_id"]), str(c["job"]), c.get("department")))
+        key = (int(c["person_id"]), str(c["job"]))
+        values[key] = (movie_id, *key, c.get("department"))
     if not values:
         return
 
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.executemany(INSERT_FILM_CREW, values)
+            _copy_merge(cur, "film_crew", FILM_CREW_COLUMNS, values.values(), INSERT_FILM_CREW)
         conn.commit()
 
 
@@ -1,5 +1,6 @@
 INSERT INTO film_cast(movie_id, person_id, cast_order)
-VALUES (%s, %s, %s)
+SELECT movie_id, person_id, cast_order
+FROM tmp_film_cast
 ON CONFLICT (movie_id, person_id)
 DO UPDATE SET
   cast_order = COALESCE(EXCLUDED.cast_order, film_cast.cast_order);
\ No newline at end of file
@@ -1,5 +1,6 @@
 INSERT INTO film_crew(movie_id, person_id, job, department)
-VALUES (%s, %s, %s, %s)
+SELECT movie_id, person_id, job, department
+FROM tmp_film_crew
 ON CONFLICT (movie_id, person_id, job)
 DO UPDATE SET
   department = COALESCE(EXCLUDED.department, film_crew.department);
\ No newline at end of file
@@ -1,3 +1,4 @@
 INSERT INTO film_genres(movie_id, genre_id)
-VALUES (%s, %s)
+SELECT movie_id, genre_id
+FROM tmp_film_genres
 ON CONFLICT DO NOTHING;
\ No newline at end of file
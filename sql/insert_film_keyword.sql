@@ -1,3 +1,4 @@
 INSERT INTO film_keywords(movie_id, keyword_id)
-VALUES (%s, %s)
+SELECT movie_id, keyword_id
+FROM tmp_film_keywords
 ON CONFLICT DO NOTHING;
\ No newline at end of file
@@ -4,7 +4,12 @@ INSERT INTO films(
   tmdb_id, tmdb_type, imdb_id,
   tmdb_vote_average, tmdb_vote_count
 )
-VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+SELECT
+  movie_id, film_name, release_year, release_date, runtime_minutes,
+  original_language, overview, poster_path, backdrop_path,
+  tmdb_id, tmdb_type, imdb_id,
+  tmdb_vote_average, tmdb_vote_count
+FROM tmp_films
 ON CONFLICT (movie_id)
 DO UPDATE SET
   film_name = COALESCE(EXCLUDED.film_name, films.film_name),
@@ -1,5 +1,5 @@
 INSERT INTO users(username, display_name, reviews_written, last_fetched_at)
-VALUES (%s, %s, %s, %s)
+VALUES (%s, %s, %s, NOW() AT TIME ZONE 'UTC')
 ON CONFLICT (username)
 DO UPDATE SET
   display_name = COALESCE(EXCLUDED.display_name, users.display_name),
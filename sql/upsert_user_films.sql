@@ -1,7 +1,8 @@
 INSERT INTO user_films(
   username, movie_id, watched, in_watchlist, rating_val, liked, has_review
 )
-VALUES (%s, %s, %s, %s, %s, %s, %s)
+SELECT username, movie_id, watched, in_watchlist, rating_val, liked, has_review
+FROM tmp_user_films
 ON CONFLICT (username, movie_id)
 DO UPDATE SET
   watched = EXCLUDED.watched,